@@ -1,10 +1,78 @@
 from __future__ import annotations
 
 import os
+import re
 from dataclasses import dataclass
-from typing import Any, Dict, Mapping, Optional
+from decimal import Decimal
+from typing import IO, TYPE_CHECKING, Any, Dict, FrozenSet, Iterator, Mapping, Optional, Tuple
 
-import requests
+if TYPE_CHECKING:
+    import requests
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:  # pragma: no cover - optional speedup
+    ijson = None
+
+# JSON responses larger than this are stream-decoded when the caller names
+# the top-level keys it needs.
+_STREAM_THRESHOLD_BYTES = 256 * 1024
+_EDI_TRACKING_KEYS = frozenset(("output", "boomi", "mft"))
+# Wrapper keys the UI unwraps to find the tracking keys; always kept when
+# streaming so nested response shapes still resolve.
+_STREAM_WRAPPER_KEYS = frozenset(("data", "json", "text"))
+_DEFAULT_DOCUMENT_ID_KEYS = ("document_id", "doc_id", "documentId")
+# Set on results that were stream-decoded and therefore hold only a subset
+# of the top-level keys.
+STREAM_DECODED_KEY = "_stream_decoded"
+# orjson turns integers beyond 64 bits into floats; any run of 19+ digits
+# may be one, so such bodies go through the stdlib parser instead.
+_LONG_DIGITS = re.compile(rb"\d{19}")
+
+_STREAM_STARTS = frozenset(("start_map", "start_array"))
+_STREAM_ENDS = frozenset(("end_map", "end_array"))
+
+
+def _build_stream_value(event: str, value: Any, events: Iterator[Tuple[str, Any]]) -> Any:
+    """Builds one JSON value from ijson events, starting at (event, value)."""
+    # ijson yields exact ints and Decimal for non-integers; convert the
+    # latter to float to match what json.loads would return.
+    if event not in _STREAM_STARTS:
+        return float(value) if isinstance(value, Decimal) else value
+    builder = ObjectBuilder()
+    builder.event(event, value)
+    depth = 1
+    for event, value in events:
+        if isinstance(value, Decimal):
+            value = float(value)
+        builder.event(event, value)
+        if event in _STREAM_STARTS:
+            depth += 1
+        elif event in _STREAM_ENDS:
+            depth -= 1
+            if not depth:
+                break
+    return builder.value
+
+
+def _skip_stream_value(event: str, events: Iterator[Tuple[str, Any]]) -> None:
+    """Consumes the events of one JSON value without building it."""
+    if event not in _STREAM_STARTS:
+        return
+    depth = 1
+    for event, _ in events:
+        if event in _STREAM_STARTS:
+            depth += 1
+        elif event in _STREAM_ENDS:
+            depth -= 1
+            if not depth:
+                return
 
 
 @dataclass(frozen=True)
@@ -30,7 +98,20 @@ class N8NClient:
             else:
                 timeout_s = 90
         self.timeout_s = timeout_s
+        raw_id_keys = os.getenv("N8N_EDI_TRACKING_ID_KEYS", "") or ""
+        self.document_id_keys = (
+            tuple(key.strip() for key in raw_id_keys.split(",") if key.strip()) or _DEFAULT_DOCUMENT_ID_KEYS
+        )
+        # Imported here so loading the UI does not pay for requests/urllib3
+        # until the first webhook call builds a client.
+        import requests
+        from requests.adapters import HTTPAdapter
+
         self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({"Connection": "keep-alive", "Accept": "application/json"})
 
     def _abs_url(self, path: str) -> str:
         base = self.config.base_url.rstrip("/")
@@ -40,17 +121,73 @@ class N8NClient:
         if not resp.content:
             return {}
         try:
-            payload = resp.json()
+            # orjson reads the raw bytes directly, skipping resp.text's decode.
+            if orjson is not None and not _LONG_DIGITS.search(resp.content):
+                payload = orjson.loads(resp.content)
+            else:
+                payload = resp.json()
             if isinstance(payload, dict):
                 return payload
             return {"data": payload}
         except ValueError:
             return {"text": resp.text}
 
-    def _post_json(self, url: str, payload: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
-        resp = self._session.post(url, json=payload, timeout=self.timeout_s)
-        resp.raise_for_status()
-        return self._json_or_text(resp)
+    def _should_stream(self, resp: requests.Response) -> bool:
+        if ijson is None or "json" not in resp.headers.get("Content-Type", "").lower():
+            return False
+        length = resp.headers.get("Content-Length", "").strip()
+        return length.isdigit() and int(length) > _STREAM_THRESHOLD_BYTES
+
+    def _stream_extract(self, raw: IO[bytes], keys: FrozenSet[str]) -> Dict[str, Any]:
+        """Decodes only the wanted top-level keys (plus wrapper keys) from a JSON stream.
+
+        Other top-level values are skipped event by event without being built,
+        so memory grows with the kept values rather than the whole body. The
+        stream is read to the end because a wrapper key such as "data" may
+        follow the tracking keys and takes priority over them in the UI.
+        """
+        events = ijson.basic_parse(raw)
+        event, value = next(events)
+        if event != "start_map":
+            return {"data": _build_stream_value(event, value, events)}
+
+        found: Dict[str, Any] = {}
+        for event, key in events:
+            if event != "map_key":
+                break
+            event, value = next(events)
+            if key in keys or key in _STREAM_WRAPPER_KEYS:
+                found[key] = _build_stream_value(event, value, events)
+            else:
+                _skip_stream_value(event, events)
+        return found
+
+    def _post_json(
+        self,
+        url: str,
+        payload: Optional[Mapping[str, Any]] = None,
+        *,
+        stream_keys: Optional[FrozenSet[str]] = None,
+    ) -> Dict[str, Any]:
+        stream = stream_keys is not None
+        if orjson is not None and payload is not None:
+            resp = self._session.post(
+                url,
+                data=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout_s,
+                stream=stream,
+            )
+        else:
+            resp = self._session.post(url, json=payload, timeout=self.timeout_s, stream=stream)
+        with resp:
+            resp.raise_for_status()
+            if stream_keys is not None and self._should_stream(resp):
+                resp.raw.decode_content = True
+                found = self._stream_extract(resp.raw, stream_keys)
+                found[STREAM_DECODED_KEY] = True
+                return found
+            return self._json_or_text(resp)
 
     def edi_document_tracking(
         self,
@@ -60,11 +197,7 @@ class N8NClient:
     ) -> Dict[str, Any]:
         """Fetches EDI document tracking data (output + actual) via webhook."""
         url = (webhook_url or os.getenv("N8N_EDI_TRACKING_URL", "") or "").strip()
-        payload: Dict[str, Any] = {
-            "document_id": document_id,
-            "doc_id": document_id,
-            "documentId": document_id,
-        }
-        if url:
-            return self._post_json(url, payload)
-        return self._post_json(self._abs_url(self.config.webhook_edi_tracking), payload)
+        payload: Dict[str, Any] = dict.fromkeys(self.document_id_keys, document_id)
+        if not url:
+            url = self._abs_url(self.config.webhook_edi_tracking)
+        return self._post_json(url, payload, stream_keys=_EDI_TRACKING_KEYS)
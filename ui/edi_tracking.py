@@ -1,47 +1,107 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, Iterable, List, Optional
+import re
+import sys
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, FrozenSet, List, Optional, Tuple
 
 import streamlit as st
 
-from api.n8n_client import N8NClient
+if TYPE_CHECKING:
+    from api.n8n_client import N8NClient
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+_DISPLAY_LIMIT = 200
+# st.cache_data is already shared by every session on the server; this only
+# bounds how many fetched responses it holds at once.
+_CACHE_MAX_ENTRIES = 512
+_TARGET_KEYS = frozenset(("output", "actual", "boomi", "mft"))
+_TRACKING_KEYS = frozenset(("output", "boomi", "mft"))
+_EMPTY_STRS = frozenset(("", "na", "n/a", "null"))
+_JSON_START = re.compile(r"\s*[{\[]")
+# orjson turns integers beyond 64 bits into floats; any run of 19+ digits
+# may be one, so such text goes through the stdlib parser instead.
+_LONG_DIGITS = re.compile(r"\d{19}")
+
+
+def _json_loads(text: str) -> Any:
+    if orjson is not None and not _LONG_DIGITS.search(text):
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _json_dumps(value: Any, *, indent: bool = False) -> str:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(value, default=str, option=option).decode()
+        except TypeError:
+            # orjson.JSONEncodeError: nesting past 255 levels or ints over 64 bits.
+            pass
+    return json.dumps(value, ensure_ascii=False, default=str, indent=2 if indent else None)
 
 
 def _unwrap_payload(payload: Any) -> Optional[Dict[str, Any]]:
-    if isinstance(payload, dict):
-        if "output" in payload or "actual" in payload or "boomi" in payload or "mft" in payload:
-            return payload
-        if "data" in payload:
-            return _unwrap_payload(payload.get("data"))
-        if "json" in payload and isinstance(payload.get("json"), dict):
-            return payload.get("json")
-        return payload
-    if isinstance(payload, list):
-        merged: Dict[str, Any] = {}
-        found = False
-        for item in payload:
-            unwrapped = _unwrap_payload(item)
-            if not unwrapped:
+    node = payload
+    while isinstance(node, dict):
+        if node.keys() & _TARGET_KEYS:
+            return node
+        if "data" in node:
+            node = node.get("data")
+            continue
+        if isinstance(node.get("json"), dict):
+            return node.get("json")
+        return node
+    if not isinstance(node, list):
+        return None
+
+    # Walk nested lists depth-first, merging every item that resolves to a
+    # dict carrying one of the target keys.
+    merged: Dict[str, Any] = {}
+    found = False
+    stack: List[Any] = list(reversed(node))
+    while stack:
+        item = stack.pop()
+        while isinstance(item, dict):
+            if item.keys() & _TARGET_KEYS:
+                merged.update(item)
+                found = True
+                break
+            if "data" in item:
+                item = item.get("data")
                 continue
-            if any(k in unwrapped for k in ("output", "actual", "boomi", "mft")):
-                merged.update(unwrapped)
+            nested = item.get("json")
+            if isinstance(nested, dict) and nested.keys() & _TARGET_KEYS:
+                merged.update(nested)
                 found = True
-        if found:
-            return merged
+            break
+        if isinstance(item, list):
+            stack.extend(reversed(item))
+    if found:
+        return merged
     return None
 
 
 def _maybe_parse_json(payload: Any) -> Any:
     if isinstance(payload, str):
-        text = payload.strip()
-        if text.startswith("{") or text.startswith("["):
+        if _JSON_START.match(payload):
             try:
-                return json.loads(text)
-            except json.JSONDecodeError:
+                # \s also matches Unicode whitespace, which JSON parsers reject.
+                return _json_loads(payload.strip())
+            except ValueError:
                 return payload
-    if isinstance(payload, dict) and isinstance(payload.get("text"), str):
-        return _maybe_parse_json(payload.get("text"))
+        return payload
+    if isinstance(payload, dict):
+        text = payload.get("text")
+        if isinstance(text, str):
+            return _maybe_parse_json(text)
     return payload
 
 
@@ -62,19 +122,39 @@ def _merge_data_list(payload: Any) -> Dict[str, Any]:
     return merged
 
 
-def _extract_key(payload: Any, key: str) -> Any:
-    payload = _maybe_parse_json(payload)
-    if isinstance(payload, dict):
-        if key in payload:
-            return payload.get(key)
-        if "data" in payload:
-            return _extract_key(payload.get("data"), key)
-    if isinstance(payload, list):
-        for item in payload:
-            found = _extract_key(item, key)
-            if found is not None:
-                return found
-    return None
+def _extract_keys(payload: Any, keys: FrozenSet[str]) -> Dict[str, Any]:
+    """Finds the first non-None value of each key in one depth-first walk."""
+    found: Dict[str, Any] = {}
+    # Each entry carries the keys its subtree may still supply: a dict that
+    # holds a key stops the search for that key beneath it, even when None.
+    stack: List[Tuple[Any, FrozenSet[str]]] = [(payload, keys)]
+    while stack and len(found) < len(keys):
+        node, wanted = stack.pop()
+        node = _maybe_parse_json(node)
+        if isinstance(node, dict):
+            descend = []
+            for key in wanted:
+                if key in found:
+                    continue
+                if key in node:
+                    value = node.get(key)
+                    if value is not None:
+                        found[key] = value
+                else:
+                    descend.append(key)
+            if descend and "data" in node:
+                stack.append((node.get("data"), frozenset(descend)))
+        elif isinstance(node, list):
+            stack.extend((item, wanted) for item in reversed(node))
+    return found
+
+
+def _digit_sort_key(item: Tuple[Any, Any]) -> int:
+    key = item[0]
+    # isdigit() rejects "-1", " 2", "+3" and "1_0", which int() would accept.
+    if not (isinstance(key, (int, str)) and str(key).isdigit()):
+        raise ValueError(key)
+    return int(key)
 
 
 def _normalize_actual(actual: Any) -> List[Dict[str, Any]]:
@@ -83,63 +163,104 @@ def _normalize_actual(actual: Any) -> List[Dict[str, Any]]:
     if isinstance(actual, list):
         return [row for row in actual if isinstance(row, dict)]
     if isinstance(actual, dict):
-        if actual and all(isinstance(k, (int, str)) and str(k).isdigit() for k in actual.keys()):
-            ordered_items = [actual[k] for k in sorted(actual.keys(), key=lambda k: int(k))]
-            return [row for row in ordered_items if isinstance(row, dict)]
-        return [actual]
+        if not actual:
+            return [actual]
+        # n8n emits arrays as {"0": {...}, "1": {...}}; any non-numeric key
+        # means this is a single row instead.
+        try:
+            ordered_items = sorted(actual.items(), key=_digit_sort_key)
+        except ValueError:
+            return [actual]
+        return [row for _, row in ordered_items if isinstance(row, dict)]
     return [{"value": actual}]
 
 
-def _ordered_columns(rows: Iterable[Dict[str, Any]]) -> List[str]:
-    seen: List[str] = []
-    for row in rows:
-        for key in row.keys():
-            if key not in seen:
-                seen.append(key)
-    return seen or ["value"]
+def _clip_for_display(value: Any, budget: int) -> Tuple[Any, int]:
+    """Trims containers and strings so that serializing them stays cheap.
+
+    Budgets count a lower bound on serialized characters, so the clipped
+    JSON only diverges from the full JSON after the first `budget` chars.
+    Recursion depth is bounded because every container costs at least one.
+    """
+    if isinstance(value, dict):
+        budget -= 1
+        clipped: Dict[Any, Any] = {}
+        for idx, (key, item) in enumerate(value.items()):
+            if budget <= 0:
+                break
+            budget -= len(str(key)) + (3 if idx == 0 else 4)
+            clipped[key], budget = _clip_for_display(item, budget)
+        return clipped, budget
+    if isinstance(value, list):
+        budget -= 1
+        items: List[Any] = []
+        for idx, item in enumerate(value):
+            if budget <= 0:
+                break
+            if idx:
+                budget -= 1
+            item, budget = _clip_for_display(item, budget)
+            items.append(item)
+        return items, budget
+    if isinstance(value, str):
+        if len(value) > budget:
+            value = value[: max(budget, 0)]
+        return value, budget - len(value) - 2
+    return value, budget - 1
 
 
 def _display_cell(value: Any) -> str:
     if value is None:
         return "NA"
     if isinstance(value, (dict, list)):
-        return json.dumps(value, ensure_ascii=True, default=str)[:200] + "..."
-    text = str(value)
-    if len(text) > 200:
-        return text[:200] + "..."
+        text = _json_dumps(_clip_for_display(value, _DISPLAY_LIMIT)[0])
+    else:
+        text = str(value)
+    if len(text) > _DISPLAY_LIMIT:
+        return text[:_DISPLAY_LIMIT] + "..."
     return text
 
 
-def _get_incoming_data(row: Dict[str, Any]) -> Any:
-    for key, value in row.items():
-        if key.lower() == "incomingdata":
-            return value
-    return None
+def _is_empty_str(value: str) -> bool:
+    return value.strip().lower() in _EMPTY_STRS
 
 
-def _is_empty_value(value: Any) -> bool:
-    if value is None:
-        return True
-    if isinstance(value, str) and not value.strip():
-        return True
-    if isinstance(value, str) and value.strip().lower() in {"na", "n/a", "null"}:
-        return True
-    if isinstance(value, (list, tuple, set)) and len(value) == 0:
-        return True
-    if isinstance(value, dict) and len(value) == 0:
-        return True
+def _is_empty_container(value: Any) -> bool:
+    return not value
+
+
+def _always_empty(value: Any) -> bool:
+    return True
+
+
+def _never_empty(value: Any) -> bool:
     return False
 
 
-def _filter_empty_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    cleaned: List[Dict[str, Any]] = []
-    for row in rows:
-        if not isinstance(row, dict):
-            continue
-        if all(_is_empty_value(value) for value in row.values()):
-            continue
-        cleaned.append(row)
-    return cleaned
+# Exact-type dispatch for the per-cell hot path; JSON rows only ever hold
+# these types, so the isinstance fallback below is rarely reached.
+_EMPTY_CHECKS: Dict[type, Callable[[Any], bool]] = {
+    type(None): _always_empty,
+    str: _is_empty_str,
+    int: _never_empty,
+    float: _never_empty,
+    bool: _never_empty,
+    list: _is_empty_container,
+    tuple: _is_empty_container,
+    set: _is_empty_container,
+    dict: _is_empty_container,
+}
+
+
+def _is_empty_value(value: Any) -> bool:
+    check = _EMPTY_CHECKS.get(type(value))
+    if check is not None:
+        return check(value)
+    if isinstance(value, str):
+        return _is_empty_str(value)
+    if isinstance(value, (list, tuple, set, dict)):
+        return _is_empty_container(value)
+    return False
 
 
 def _render_incoming_dialog(title: str, data: Any) -> None:
@@ -153,37 +274,67 @@ def _render_incoming_dialog(title: str, data: Any) -> None:
     _dialog()
 
 
+def _build_table(rows: List[Dict[str, Any]]) -> Optional[Tuple[Any, Dict[int, Any]]]:
+    """Builds the display DataFrame and incomingData lookup for one table."""
+    import pandas as pd
+
+    # Single pass: skip empty rows, collect column order, format cells and
+    # pull out incomingData for the popup.
+    is_empty = _is_empty_value
+    display_cell = _display_cell
+    seen_cols: Dict[str, None] = {}
+    display_rows: List[Dict[str, Any]] = []
+    incoming_lookup: Dict[int, Any] = {}
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        cells: Dict[str, Any] = {}
+        all_empty = True
+        has_incoming = False
+        incoming = None
+        for key, value in row.items():
+            if all_empty and not is_empty(value):
+                all_empty = False
+            if key.lower() == "incomingdata":
+                if not has_incoming:
+                    has_incoming = True
+                    incoming = value
+                continue
+            cells[key] = display_cell(value)
+        if all_empty:
+            continue
+        seen_cols.update(dict.fromkeys(cells))
+        if incoming not in (None, "", []):
+            incoming_lookup[len(display_rows)] = incoming
+        display_rows.append(cells)
+
+    if not display_rows:
+        return None
+
+    columns = [sys.intern(key) for key in seen_cols]
+    table_df = pd.DataFrame.from_records(display_rows, columns=columns).fillna("NA")
+    return table_df, incoming_lookup
+
+
 def _render_actual_table(
-    rows: List[Dict[str, Any]],
+    built: Optional[Tuple[Any, Dict[int, Any]]],
     *,
     enable_popup: bool = True,
     selection_key: Optional[str] = None,
 ) -> None:
-    rows = _filter_empty_rows(rows)
-    if not rows:
+    if built is None:
         st.write("NA")
         return
-
-    columns = [c for c in _ordered_columns(rows) if c.lower() != "incomingdata"]
-    display_rows: List[Dict[str, Any]] = []
-    incoming_lookup: Dict[int, Any] = {}
-    for idx, row in enumerate(rows):
-        ordered: Dict[str, Any] = {}
-        value = _get_incoming_data(row)
-        if value not in (None, "", []):
-            incoming_lookup[idx] = value
-        for key in columns:
-            ordered[key] = _display_cell(row.get(key))
-        display_rows.append(ordered)
+    table_df, incoming_lookup = built
 
     row_height = 35
     header_height = 38
     max_height = 520
-    table_height = min(max_height, header_height + row_height * len(display_rows))
+    table_height = min(max_height, header_height + row_height * len(table_df))
 
     if enable_popup:
         event = st.dataframe(
-            display_rows,
+            table_df,
             use_container_width=True,
             height=table_height,
             hide_index=True,
@@ -206,7 +357,7 @@ def _render_actual_table(
     else:
         st.session_state.pop(selection_key or "mft_table", None)
         st.dataframe(
-            display_rows,
+            table_df,
             use_container_width=True,
             height=table_height,
             hide_index=True,
@@ -214,10 +365,48 @@ def _render_actual_table(
         )
 
 
-@st.cache_data(ttl=15, show_spinner=False)
+@dataclass(frozen=True)
+class _DerivedTracking:
+    output: Any
+    boomi_table: Optional[Tuple[Any, Dict[int, Any]]]
+    mft_table: Optional[Tuple[Any, Dict[int, Any]]]
+    raw_json: str
+    stream_decoded: bool
+
+
+def _derive(response: Dict[str, Any]) -> _DerivedTracking:
+    from api.n8n_client import STREAM_DECODED_KEY
+
+    stream_decoded = isinstance(response, dict) and bool(response.get(STREAM_DECODED_KEY))
+    if stream_decoded:
+        response = {key: value for key, value in response.items() if key != STREAM_DECODED_KEY}
+    response_data = _maybe_parse_json(response)
+    merged = _merge_data_list(response_data)
+    unwrapped = _unwrap_payload(response_data) or {}
+    extracted = {key: merged.get(key) or unwrapped.get(key) for key in _TRACKING_KEYS}
+    missing = frozenset(key for key, value in extracted.items() if not value)
+    if missing:
+        walked = _extract_keys(response_data, missing)
+        extracted.update((key, walked.get(key)) for key in missing)
+    return _DerivedTracking(
+        output=extracted["output"],
+        boomi_table=_build_table(_normalize_actual(extracted["boomi"])),
+        mft_table=_build_table(_normalize_actual(extracted["mft"])),
+        raw_json=_json_dumps(response, indent=True),
+        stream_decoded=stream_decoded,
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def _get_client() -> N8NClient:
+    from api.n8n_client import N8NClient
+
+    return N8NClient()
+
+
+@st.cache_data(ttl=15, show_spinner=False, max_entries=_CACHE_MAX_ENTRIES)
 def _fetch_tracking(document_id: str) -> Dict[str, Any]:
-    client = N8NClient()
-    return client.edi_document_tracking(document_id)
+    return _get_client().edi_document_tracking(document_id)
 
 
 def render() -> None:
@@ -240,6 +429,7 @@ def render() -> None:
             with st.spinner("Calling n8n workflow..."):
                 try:
                     st.session_state["edi_tracking_response"] = _fetch_tracking(doc_id.strip())
+                    st.session_state.pop("edi_tracking_derived", None)
                 except Exception as exc:  # noqa: BLE001
                     st.error(f"Failed to fetch tracking data: {exc}")
                     return
@@ -249,12 +439,13 @@ def render() -> None:
         st.info("Submit a Document ID to view results.")
         return
 
-    response_data = _maybe_parse_json(response)
-    merged = _merge_data_list(response_data)
-    unwrapped = _unwrap_payload(response_data) or {}
-    output = merged.get("output") or unwrapped.get("output") or _extract_key(response_data, "output")
-    actual = merged.get("boomi") or unwrapped.get("boomi") or _extract_key(response_data, "boomi")
-    mft = merged.get("mft") or unwrapped.get("mft") or _extract_key(response_data, "mft")
+    # Row-selection reruns reuse the parsed result held in session state;
+    # it is dropped whenever a new response is fetched.
+    derived = st.session_state.get("edi_tracking_derived")
+    if derived is None:
+        derived = _derive(response)
+        st.session_state["edi_tracking_derived"] = derived
+    output = derived.output
 
     st.subheader("Summary")
     if isinstance(output, str) and output.strip():
@@ -265,12 +456,23 @@ def render() -> None:
         st.write("NA")
 
     st.subheader("Boomi (SQL data)")
-    rows = _normalize_actual(actual)
-    _render_actual_table(rows, enable_popup=True, selection_key="boomi_table")
+    _render_actual_table(
+        derived.boomi_table,
+        enable_popup=True,
+        selection_key="boomi_table",
+    )
 
     st.subheader("MFT (SQL data)")
-    mft_rows = _normalize_actual(mft)
-    _render_actual_table(mft_rows, enable_popup=False, selection_key="mft_table")
+    _render_actual_table(
+        derived.mft_table,
+        enable_popup=False,
+        selection_key="mft_table",
+    )
 
     with st.expander("Raw response (n8n)", expanded=False):
-        st.json(response)
+        if derived.stream_decoded:
+            st.caption(
+                "This response was large and stream-decoded, so only the output/boomi/mft "
+                "and data/json/text top-level keys are shown."
+            )
+        st.json(derived.raw_json)